@@ -1,41 +1,176 @@
 from pdfplumber.display import BasePageImage,AbstractImageHandler
 from pdfplumber.display import image_handler_types
 from pdfplumber.display import DEFAULT_RESOLUTION
+from pdfplumber.display import DEFAULT_PNG_COMPRESS_LEVEL
+from pdfplumber.display import DEFAULT_FILL, DEFAULT_STROKE, DEFAULT_STROKE_WIDTH
 from pdfplumber.display import get_page_image
 from io import BytesIO
 from pdfplumber.page import Page
 import cv2
 import numpy as np
 import pathlib as pl
+import PIL.ImageColor
+from collections import OrderedDict
+from itertools import groupby
+from operator import itemgetter
+
+
+# The bounds of a pdfplumber object, as draw_rects reads them.
+_BOUNDS_DTYPE = np.dtype([("x0", np.float64), ("top", np.float64), ("x1", np.float64), ("bottom", np.float64)])
+
+# PIL modes whose raw encoder can write the channels out in opencv's order, mapped to that raw mode.
+_BGR_RAW_MODES = {"RGB": "BGR", "RGBA": "BGRA", "L": "L"}
+
+
+def pil_to_bgr_ndarray(pil_img):
+    """Returns the pixels of an 8-bit PIL image as a uint8 array in opencv's channel order: (height, width, 3) BGR for
+    RGB images, (height, width, 4) BGRA for RGBA images and (height, width) for grayscale ("L") images. Images in any
+    other mode are converted to RGB first.
+
+    PIL's raw encoder writes the channels out in opencv's order itself, so the swap happens during the one copy out of
+    the PIL image rather than as a separate pass over a numpy array. The returned array is a read-only view over that
+    copy; call .copy() on it if it's going to be drawn on.
+    """
+    if pil_img.mode not in _BGR_RAW_MODES:
+        pil_img = pil_img.convert("RGB")
+    raw_mode = _BGR_RAW_MODES[pil_img.mode]
+    width, height = pil_img.size
+    shape = (height, width) if raw_mode == "L" else (height, width, len(raw_mode))
+    return np.frombuffer(pil_img.tobytes("raw", raw_mode), dtype=np.uint8).reshape(shape)
+
+
+def bgr_and_alpha(color):
+    """Splits a PIL style color, either an RGB(A) tuple or a color name, into an opencv BGR tuple and an alpha in [0,1].
+    """
+    if isinstance(color, str):
+        color = PIL.ImageColor.getrgb(color)
+    alpha = color[3] / 255 if len(color) == 4 else 1.0
+    return (color[2], color[1], color[0]), alpha
 
 
 class CV2ImageHandlerExample(AbstractImageHandler):
+    # Pixels of the most recently rasterized pages, keyed by (id(stream), page_number, resolution), so opening the same
+    # page again doesn't rasterize it again. The arrays are read-only, so every handler can share them; drawing always
+    # happens on a copy, see _ensure_writable.
+    _raster_cache = OrderedDict()
+    raster_cache_size = 8
+
+    __slots__ = ("_reset_buffer", "_size", "_queue")
+
+    @classmethod
+    def page_pixels(cls, stream, page_number, resolution):
+        """Returns the read-only BGR pixels of a page, rasterizing it only if it isn't in the cache already.
+
+        :param stream: the pdf's stream, as kept by pdfplumber.PDF.stream.
+        :param page_number: zero-based index of the page.
+        :param resolution: the resolution to rasterize at, in dots per inch.
+        """
+        key = (id(stream), page_number, resolution)
+        hit = cls._raster_cache.get(key)
+        # the stream is kept alongside its pixels, so its id can't be reused by another stream while it's cached.
+        if hit is not None and hit[0] is stream:
+            cls._raster_cache.move_to_end(key)
+            return hit[1]
+        pixels = pil_to_bgr_ndarray(get_page_image(stream,page_number,resolution))
+        cls._raster_cache[key] = (stream, pixels)
+        while len(cls._raster_cache) > cls.raster_cache_size:
+            cls._raster_cache.popitem(last=False)
+        return pixels
+
+    @classmethod
+    def invalidate_cache(cls):
+        """Drops every cached page, e.g. once the pdf they came from is closed."""
+        cls._raster_cache.clear()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The annotated array that reset() or _ensure_writable last allocated, until it's handed out through
+        # annotated_image. Only that array is ever overwritten on a reset, since an annotated array that the caller
+        # holds, assigned, or shared from an optional_source_handler may be referenced elsewhere.
+        self._reset_buffer = None
+        # (width, height) of the original, worked out the first time size is asked for.
+        self._size = None
+        # Draw calls that haven't reached the annotated image yet, as (op, color, outline_color, thickness, lineType,
+        # shapes) tuples. See flush.
+        self._queue = []
 
     @property
     def original_image(self):
+        if self._original is None:
+            # like PILImageHandler, the page is only rasterized once its pixels are first needed.
+            self._original = self.page_pixels(self.stream,self.page_number,self.resolution)
         return self._original
 
     @property
     def annotated_image(self):
+        annotated = self._current_annotated()
+        # the caller holds the array from now on, so later resets and draws mustn't copy over it.
+        self._reset_buffer = None
+        return annotated
+
+    def _current_annotated(self):
+        """The annotated image, as the annotated_image getter returns it, for use within the handler itself."""
+        if self._queue:
+            self.flush()
         if self._annotated is None:
-            if self._original is not None:
-                self._annotated = self._original.copy()
+            # Until something is drawn, the annotated image looks exactly like the original, so the original is
+            # shared rather than copied. See _ensure_writable.
+            self._annotated = self.original_image
         return self._annotated
 
+    def _ensure_writable(self):
+        """Gives the annotated image its own writable buffer, if it's still sharing the original's or is read-only,
+        before drawing on it."""
+        if self._annotated is None or self._annotated is self._original:
+            original = self.original_image
+            buffer = self._reset_buffer
+            if buffer is not None and buffer.shape == original.shape and buffer.dtype == original.dtype:
+                # Copying over the buffer from before the last reset clears its annotations without allocating.
+                np.copyto(buffer, original)
+            else:
+                buffer = self._reset_buffer = original.copy()
+            self._annotated = buffer
+        elif not self._annotated.flags.writeable:
+            self._annotated = self._annotated.copy()
+
+    def _load_path(self, path):
+        return cv2.imread(str(path))
+
+    def _load_page(self, page):
+        # we need to imitate the `get_page_image` function from `pdfplumber.display`, adapting to opencv equivalent
+        # functionality where possible.
+        self._stream = page.pdf.stream
+        self._page_num = page.page_number
+        # get_page_image returns an RGB PIL image, while opencv works in BGR order; cv2.imread and cv2.imwrite
+        # both assume BGR, so we store it that way.
+        return self.page_pixels(self.stream,self.page_number,self.resolution)
+
+    def _load_array(self, array):
+        return array
+
+    # How each kind of source the image setters accept is turned into an ndarray, looked up by the source's type.
+    _loaders = {str: _load_path, pl.Path: _load_path, Page: _load_page, np.ndarray: _load_array}
+
+    def _load_image(self, path_page_or_array):
+        """Returns the pixels for path_page_or_array, which may be a path to an image file, a pdfplumber Page or an
+        ndarray."""
+        loader = self._loaders.get(type(path_page_or_array))
+        if loader is None:
+            # subclasses, e.g. pathlib.PosixPath or a DerivedPage, miss the lookup on their exact type.
+            for klass, candidate in self._loaders.items():
+                if isinstance(path_page_or_array, klass):
+                    loader = candidate
+                    break
+            else:
+                raise ValueError("path_or_array was passed an object that wasn't a valid path string, pdfplumber Page, "
+                                 "nor numpy ndarray.")
+        return loader(self, path_page_or_array)
+
     @original_image.setter
     def original_image(self, path_page_or_array):
-        if isinstance(path_page_or_array, (str,pl.Path)):
-            self._original = cv2.imread(path_page_or_array)
-        elif isinstance(path_page_or_array,Page):
-            # we need to imitate the `get_page_image` function from `pdfplumber.display`, adapting to opencv equivalent
-            # functionality where possible.
-            self._stream = path_page_or_array.pdf.stream
-            self._page_no = path_page_or_array.page_number
-            self._original = np.array(get_page_image(self.stream,self.page_number,self.resolution))
-        elif isinstance(path_page_or_array,np.ndarray):
-            self._original = path_page_or_array
-        else:
-            raise ValueError("path_or_array was passed an object that wasn't a valid path string, pdfplumber Page, nor numpy ndarray.")
+        # Arrays loaded from a Page are read-only and shared, which is fine since the original is never drawn on.
+        self._original = self._load_image(path_page_or_array)
+        self._size = None
         # Because we've changed the original image, we should make sure the
         # annotated image reflects this.
         #       Note: a more advanced implementation might backup the annotated image somehow,
@@ -50,19 +185,17 @@ class CV2ImageHandlerExample(AbstractImageHandler):
         # Also note:
         #   Possible problem here, as we change the annotated image, but have no means to assure that
         #   this change is in any way related to our current reference to the original.
-        if isinstance(path_page_or_array, (str,pl.Path)):
-            self._annotated = cv2.imread(path_page_or_array)
-        elif isinstance(path_page_or_array,Page):
-            # we need to imitate the `get_page_image` function from `pdfplumber.display`, adapting to opencv equivalent
-            # functionality where possible.
-            self._stream = path_page_or_array.pdf.stream
-            self._page_no = path_page_or_array.page_number
-            self._annotated = np.array(get_page_image(self.stream,self.page_number,self.resolution))
-        else:
-            raise ValueError("path_or_array was passed an object that wasn't a valid path string, pdfplumber Page, nor numpy ndarray.")
+        # A read-only array, e.g. one loaded from a Page, is copied by _ensure_writable before anything draws on it.
+        self._queue.clear()
+        self._annotated = self._load_image(path_page_or_array)
 
     def save(self, fp, format=None, **params):
-        data_to_save = params.pop("data_to_save",self._annotated) # type: np.ndarray
+        data_to_save = params.pop("data_to_save",None) # type: np.ndarray
+        if data_to_save is None:
+            data_to_save = self._current_annotated()
+        # libpng's default compression level is much slower to encode than level 1, for a modest saving in file size.
+        png_compress_level = params.pop("png_compress_level",DEFAULT_PNG_COMPRESS_LEVEL)
+        imwrite_params = [cv2.IMWRITE_PNG_COMPRESSION, png_compress_level]
         # a proper implementation of this CV2ImageHandlerExample would also include
         # sanity checks that filename is correctly formatted, has a valid file typing extension,
         # and that the data_to_save has an appropriate numpy dtype for that extension.
@@ -70,89 +203,218 @@ class CV2ImageHandlerExample(AbstractImageHandler):
             fp = str(fp.resolve())
         if isinstance(fp,str):
             # save img to disk using fp as a path string
-            cv2.imwrite(fp, data_to_save)
+            cv2.imwrite(fp, data_to_save, imwrite_params)
         elif isinstance(fp,BytesIO):
-            format = format if format is not None else "PNG"
-            good,byte_arr = cv2.imencode(format,data_to_save)
-            fp.write(byte_arr)
+            # cv2.imencode picks the encoder from a file extension, e.g. ".png", rather than a format name.
+            ext = "." + (format if format is not None else "PNG").lower().lstrip(".")
+            good,byte_arr = cv2.imencode(ext,data_to_save,imwrite_params)
+            if not good:
+                raise ValueError(f"CV2ImageHandlerExample.save could not encode the image as {ext}")
+            # writing the array's buffer directly avoids converting it to a bytes object first.
+            fp.write(byte_arr.data)
         else:
             raise ValueError("CV2ImageHandlerExample.save(fp,format,**params) was given an unrecognized object for the `fp` parameter."
                              f"\n\ttype(fp): {type(fp)}")
 
     def reset(self, mode=None, **kwargs):
-        """In this implementation, we are taking the image mode and using it as we would a numpy.dtype"""
-        if mode is None:
-            mode = self._annotated.dtype
-        elif isinstance(mode,str):
-            if "rgb" == mode.lower():
-                mode = np.uint8
-            elif "rgba" == mode.lower():
-                mode = np.float32
-        self.annotated_image = self._original.astype(mode)
-
-    def size(self, **kwargs):
-        # This naive implementation assumes that the original image is a single image.
-        # Where the 0'th dimension is height, and the 1'st dimension is width
-        return self.original_image.shape[1:0:-1]
+        """In this implementation, we are taking the image mode and using it as we would a numpy.dtype.
+
+        Both "rgb" and "rgba" keep the 8-bit channels of the original: opencv's drawing functions don't blend with an
+        alpha channel anyway, and a float32 working copy would be 4 times the size and slower to draw on.
+        """
+        # anything still queued would have been drawn on the annotations being cleared.
+        self._queue.clear()
+        original = self.original_image
+        if mode is None or isinstance(mode,str):
+            mode = original.dtype
+        annotated = self._annotated
+        if mode == original.dtype:
+            # Go back to sharing the original until something is drawn, see _ensure_writable.
+            self._annotated = original
+        elif (annotated is not None and annotated is self._reset_buffer
+                and annotated.shape == original.shape and annotated.dtype == mode):
+            # Copying over the existing buffer clears the annotations without allocating a new one.
+            np.copyto(annotated, original)
+        else:
+            self._annotated = self._reset_buffer = original.astype(mode)
+
+    @property
+    def size(self):
+        """(width, height) of the original image, matching PILImageHandler.size."""
+        if self._size is None:
+            # This naive implementation assumes that the original image is a single image.
+            # Where the 0'th dimension is height, and the 1'st dimension is width
+            height, width = self.original_image.shape[:2]
+            self._size = (width, height)
+        return self._size
+
+    @property
+    def unannotated_mode(self):
+        if self._queue or not (self._annotated is None or self._annotated is self._original):
+            return None
+        # the annotated image is still the original itself, see the annotated_image getter.
+        return self.original_image.dtype.name
 
     def crop_original(self, cropbox, **kwargs):
-        # The order of points in the cropbox parameter needs to be double checked, but if we assume
-        # that cropbox[0] is the top left corner of the box, and cropbox[1:4] proceeds in clockwise
-        # order through the box vertices, then the following is an appropriate, if not over-simple,
-        # implementation.
-        # Also assume that each point is a 2-tuple expressing coordinate data in the form of (x,y).
-        top = cropbox[0][1]
-        bottom = cropbox[3][1]
-        left = cropbox[0][0]
-        right = cropbox[1][0]
-        # again, this is implementation assumes we aren't working with a stack of images, and that the 0'th
-        # axis is the height of the image, and the 1'st axis is the width.
-        self._original = self._original[top:bottom,left:right]
-        self._annotated = self._annotated[top:bottom,left:right]
+        """Crops the original image down to cropbox, given as (left, top, right, bottom) pixel coordinates just like
+        PIL.Image.crop takes them, then resets the annotated image to match."""
+        # this implementation assumes we aren't working with a stack of images, and that the 0'th axis is the height of
+        # the image, and the 1'st axis is the width.
+        height, width = self.original_image.shape[:2]
+        left, top, right, bottom = (int(v) for v in cropbox)
+        left, right = max(left, 0), min(right, width)
+        top, bottom = max(top, 0), min(bottom, height)
+        if left >= right or top >= bottom:
+            raise ValueError(f"CV2ImageHandlerExample.crop_original was given a cropbox, {cropbox}, that leaves no "
+                             f"pixels of the {width}x{height} image.")
+        # A slice of the original would be a strided view, which opencv copies or handles on a slower path every time
+        # it's used, so the crop is made contiguous once here.
+        self._original = np.ascontiguousarray(self._original[top:bottom,left:right])
+        self._size = None
+        self.reset()
 
+    def flush(self):
+        """Draws every queued shape onto the annotated image.
+
+        The drawing methods only queue their shapes, since each opencv call carries a fixed cost that adds up over the
+        thousands of shapes something like outline_words draws. Consecutive queue entries that share an op and
+        drawing style are drawn together with one batched call. Runs aren't merged across other entries, so shapes
+        still land in the order they were drawn in.
+
+        This is called whenever the annotated image is read, by the annotated_image getter or by save, so it rarely needs calling directly.
+        """
+        queue, self._queue = self._queue, []
+        for (op, *style), entries in groupby(queue, key=itemgetter(slice(0, 5))):
+            entries = list(entries)
+            if len(entries) == 1:
+                # a run of one is drawn as it was queued, which keeps an (N,4) array from draw_rects intact.
+                shapes = entries[0][5]
+            else:
+                shapes = [shape for entry in entries for shape in entry[5]]
+            self._drawers[op](self, shapes, *style)
+
+    def _queue_shapes(self, op, shapes, color, outline_color, kwargs, default_thickness):
+        if len(shapes):
+            thickness = kwargs.get("thickness",kwargs.get("width",default_thickness))
+            lineType = kwargs.get("lineType",cv2.LINE_8)
+            if not isinstance(shapes, np.ndarray):
+                shapes = list(shapes)
+            self._queue.append((op, color, outline_color, int(thickness), lineType, shapes))
 
     def line(self, points, color, width, **kwargs):
-        if len(points)==2:
-            x1,y1 = points[0]
-            x2,y2 = points[1]
-        else:
-            x1,y1,x2,y2 = points
-        thickness = kwargs.get("thickness",width)
-        lineType = kwargs.get("lineType",None)
-        shift = kwargs.get("shift",None)
-        cv2.line(self._annotated,(x1,y1),(x2,y2),color,thickness,lineType,shift)
+        self.lines([points], color, width, **kwargs)
+
+    def lines(self, list_of_points, color, width, **kwargs):
+        """Queues lines, each given as a sequence of (x,y) points, e.g. ((x1,y1),(x2,y2)), or as flat coordinates, e.g.
+        (x1,y1,x2,y2). See flush."""
+        kwargs.setdefault("width",width)
+        # every line becomes its own (k,2) int32 array of points here, whichever form it came in, so lines queued by
+        # different callers can share a batch.
+        polylines = [np.rint(np.asarray(points,dtype=np.float64).reshape(-1,2)).astype(np.int32)
+                     for points in list_of_points]
+        self._queue_shapes("line", polylines, color, None, kwargs, 1)
 
     def rectangle(self, bbox, color, outline_color, **kwargs):
-        if len(bbox)==2:
-            x1,y1 = bbox[0]
-            x2,y2 = bbox[1]
-        else:
-            x1,y1,x2,y2 = bbox
-        thickness = kwargs.get("thickness",1)
-        lineType = kwargs.get("lineType",None)
-        shift = kwargs.get("shift",None)
-        cv2.rectangle(self._annotated,(x1,y1),(x2,y2),color,thickness,lineType,shift)
+        self.rectangles([bbox], color, outline_color, **kwargs)
+
+    def rectangles(self, bboxes, color, outline_color, **kwargs):
+        """Queues rectangles, each given as ((x0,y0),(x1,y1)) or (x0,y0,x1,y1). See flush."""
+        self._queue_shapes("rectangle", bboxes, color, outline_color, kwargs, 1)
 
     def ellipse(self, bbox, color, stroke, **kwargs):
-        if len(bbox)==2:
-            x1,y1 = bbox[0]
-            x2,y2 = bbox[1]
-        else:
-            x1,y1,x2,y2 = bbox
-        axis_len = x2-x1,y2-y1
-        center = axis_len[0]//2,axis_len[1]//2
-        thickness = kwargs.get("thickness",1)
-        lineType = kwargs.get("lineType",None)
-        shift = kwargs.get("shift",None)
-        cv2.ellipse(self._annotated,center,axis_len,0,360,color,thickness,lineType,shift)
+        self.ellipses([bbox], color, stroke, **kwargs)
+
+    def ellipses(self, bboxes, color, stroke, **kwargs):
+        """Queues ellipses, each given by its bounding box as ((x0,y0),(x1,y1)) or (x0,y0,x1,y1). See flush."""
+        self._queue_shapes("ellipse", bboxes, color, stroke, kwargs, 1)
+
+    def _draw_lines(self, polylines, color, _, thickness, lineType):
+        """Draws every line, a (k,2) int32 array of points as queued by lines, with a single cv2.polylines call."""
+        stroke,alpha = bgr_and_alpha(color)
+        if alpha <= 0 or thickness <= 0:
+            return
+        self._ensure_writable()
+        cv2.polylines(self._annotated,polylines,False,stroke,thickness,lineType)
+
+    def _draw_rects(self, bboxes, color, outline_color, thickness, lineType):
+        """Draws every rectangle in bboxes with a single cv2.fillPoly call for the fills and a single cv2.polylines call
+        for the outlines, rather than making a cv2.rectangle call per bbox.
+
+        opencv has no notion of alpha, so a translucent fill is drawn onto a copy of the image that is then blended back
+        in with cv2.addWeighted. Overlapping translucent fills therefore don't darken each other the way they do with
+        PIL. Outlines are always drawn opaque.
+        """
+        x0,y0,x1,y1 = np.rint(np.asarray(bboxes,dtype=np.float64).reshape(-1,4)).astype(np.int32).T
+        # shape (N,4,2), the corners of each rect going clockwise from the top left.
+        corners = np.stack([np.stack(pt,axis=1) for pt in ((x0,y0),(x1,y0),(x1,y1),(x0,y1))],axis=1)
+        self._ensure_writable()
+        fill,fill_alpha = bgr_and_alpha(color)
+        if fill_alpha >= 1:
+            cv2.fillPoly(self._annotated,corners,fill,lineType)
+        elif fill_alpha > 0:
+            overlay = self._annotated.copy()
+            cv2.fillPoly(overlay,corners,fill,lineType)
+            cv2.addWeighted(overlay,fill_alpha,self._annotated,1-fill_alpha,0,dst=self._annotated)
+        outline,outline_alpha = bgr_and_alpha(outline_color)
+        if outline_alpha > 0 and thickness > 0:
+            cv2.polylines(self._annotated,corners,True,outline,thickness,lineType)
+
+    def _draw_ellipses(self, bboxes, color, stroke, thickness, lineType):
+        """Draws the axis aligned ellipse inscribed in each bbox. Fills and outlines follow the same rules as
+        _draw_rects."""
+        x0,y0,x1,y1 = np.rint(np.asarray(bboxes,dtype=np.float64).reshape(-1,4)).astype(np.int32).T
+        # cv2.ellipse takes the center and the half-lengths of the axes, in whole pixels. A zero length axis would
+        # draw nothing, so each is at least a pixel long.
+        centers = list(zip(((x0+x1)//2).tolist(),((y0+y1)//2).tolist()))
+        axes = list(zip(np.maximum((x1-x0)//2,1).tolist(),np.maximum((y1-y0)//2,1).tolist()))
+        self._ensure_writable()
+        fill,fill_alpha = bgr_and_alpha(color)
+        if fill_alpha > 0:
+            target = self._annotated if fill_alpha >= 1 else self._annotated.copy()
+            for center,axis in zip(centers,axes):
+                cv2.ellipse(target,center,axis,0,0,360,fill,cv2.FILLED,lineType,0)
+            if target is not self._annotated:
+                cv2.addWeighted(target,fill_alpha,self._annotated,1-fill_alpha,0,dst=self._annotated)
+        outline,outline_alpha = bgr_and_alpha(stroke)
+        if outline_alpha > 0 and thickness > 0:
+            for center,axis in zip(centers,axes):
+                cv2.ellipse(self._annotated,center,axis,0,0,360,outline,thickness,lineType,0)
+
+    _drawers = {"line": _draw_lines, "rectangle": _draw_rects, "ellipse": _draw_ellipses}
 
 
 image_handler_types["CV2"] = CV2ImageHandlerExample
 
 
 class CV2PageImage(BasePageImage):
+    __slots__ = ("png_compress_level",)
+
     def __init__(self, page, original: AbstractImageHandler = None, resolution=None,
-                 image_handler_type: str or CV2ImageHandlerExample=CV2ImageHandlerExample):
+                 image_handler_type: str or CV2ImageHandlerExample=CV2ImageHandlerExample,
+                 png_compress_level=DEFAULT_PNG_COMPRESS_LEVEL):
+        """
+        :param png_compress_level: the zlib compression level (0-9) used when saving PNGs. Lower levels encode faster
+                                   at the cost of larger files.
+        """
+        self.png_compress_level = png_compress_level
         resolution = resolution if resolution is not None else DEFAULT_RESOLUTION
         image_handler_type = image_handler_types.get(image_handler_type,CV2ImageHandlerExample)
-        super().__init__(page, original, resolution, image_handler_type)
\ No newline at end of file
+        super().__init__(page, original, resolution, image_handler_type)
+
+    def draw_rects(self, list_of_rects, fill=DEFAULT_FILL, stroke=DEFAULT_STROKE, stroke_width=DEFAULT_STROKE_WIDTH):
+        """Same as BasePageImage.draw_rects, except that a list of objects, like the words outline_words draws or the
+        chars outline_chars draws, is read into a record array of their bounds with one np.fromiter call and
+        reprojected to pixels in a single vectorized step, rather than one rect at a time."""
+        if (not isinstance(list_of_rects, list) or not list_of_rects
+                or isinstance(list_of_rects[0], (tuple, list))):
+            return super().draw_rects(list_of_rects, fill, stroke, stroke_width)
+        bounds = np.fromiter(((obj["x0"], obj["top"], obj["x1"], obj["bottom"]) for obj in list_of_rects),
+                             dtype=_BOUNDS_DTYPE, count=len(list_of_rects))
+        # the record array's fields are contiguous float64s, so it can be viewed as an (N,4) array without a copy.
+        bboxes = bounds.view(np.float64).reshape(-1, 4) * self._scale_f + np.array(self._rect_offsets(stroke_width))
+        self._draw_pixel_rects(bboxes, fill, stroke, stroke_width)
+        return self
+
+    def save(self, *args, **kwargs):
+        kwargs.setdefault("png_compress_level", self.png_compress_level)
+        self._image_handler.save(*args, **kwargs)
@@ -1,70 +1,287 @@
+import csv
+import io
+import itertools
+import os
 import pathlib as pl
+import pickle
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import itemgetter
 from typing import List
 from examples.subclassing_example.cv2_page_image_example import CV2PageImage
+from examples.subclassing_example.cv2_page_image_example import DEFAULT_PNG_COMPRESS_LEVEL
+from examples.subclassing_example.cv2_page_image_example import pil_to_bgr_ndarray
+from pdfplumber import utils
 from pdfplumber.pdf import PDF
 from pdfplumber.table import Table
-from pdfplumber.table import Row
 from pdfplumber.display import PageImage
 import cv2
 import numpy as np
+try:
+    # numba is optional, when it's installed the word bucketing loop is compiled to native code.
+    from numba import njit
+except ImportError:
+    njit = None
 
 
-# setting the image resolution to 200 seems to produce acceptable image visuals.
+# setting the image resolution to 200 seems to produce acceptable image visuals, so we never render above that.
 RESOLUTION = 200
+# pages are rendered at whatever resolution makes the page's widest table roughly this many pixels wide.
+TABLE_IMAGE_WIDTH = 1200
+# number of threads each page's worker uses to write its table images and text files.
+IO_WORKERS = 4
 test_path = pl.Path(r"..\pdfs\M68kOpcodes-v2.3.pdf").resolve()
 
+# used to turn table names into file names, runs of spaces become a single "-" before the remaining characters are
+# swapped out in one pass.
+multi_space_pat = re.compile(r" {2,}")
+filename_table = str.maketrans({".": "_", " ": "-"})
 
-def source_file_specific_logic(page, output_dir:pl.Path,page_num:int):
+
+@lru_cache(maxsize=2048)
+def header_file_stem(header_txt:tuple)->str:
+    """Builds the file name prefix for a table from its header text. Documents like the demo pdf repeat the same
+    table headers from page to page, so the result is cached by the header text.
+    """
+    return multi_space_pat.sub("-", "_".join(header_txt)).translate(filename_table)
+
+
+char_bbox = itemgetter("x0", "top", "x1", "bottom")
+
+
+def char_bounds(chars):
+    """Returns the (x0, top, x1, bottom) bounding box of each char, as one contiguous float64[n, 4] array.
+
+    :param chars: the list of char dicts for the page, as found in `page.chars`.
+    """
+    if not chars:
+        return np.empty((0, 4))
+    # np.fromiter fills the array straight from the chars' coordinates, without an intermediate list of tuples.
+    return np.fromiter(itertools.chain.from_iterable(map(char_bbox, chars)), dtype=np.float64,
+                       count=4 * len(chars)).reshape(-1, 4)
+
+
+def _cell_members_numpy(bounds, boxes):
+    """Finds the chars that lie fully within each of the given boxes, the same test `page.within_bbox` uses. Boxes may
+    overlap, as the rows of a table with merged cells do, in which case a char belongs to every box that holds it.
+
+    :param bounds: the (x0, top, x1, bottom) bounding box of each char. See char_bounds.
+    :param boxes: the (x0, top, x1, bottom) bounding box of each cell.
+    :return: order, the indices of the chars inside each box grouped by box, keeping the order the chars were given in
+             within a box. And ranges, an int64[n_boxes, 2] array holding the start and end of each box's slice of order.
+    """
+    inside = ((bounds[:, None, 0] >= boxes[None, :, 0]) & (bounds[:, None, 1] >= boxes[None, :, 1])
+              & (bounds[:, None, 2] <= boxes[None, :, 2]) & (bounds[:, None, 3] <= boxes[None, :, 3]))
+    # within_bbox also leaves out chars with neither width nor height.
+    inside &= ((bounds[:, 2] - bounds[:, 0]) + (bounds[:, 3] - bounds[:, 1]) > 0)[:, None]
+    # nonzero walks the transposed mask box by box, and char by char within each box.
+    order = np.nonzero(inside.T)[1]
+    counts = inside.sum(axis=0)
+    ends = np.cumsum(counts)
+    return order, np.stack((ends - counts, ends), axis=1)
+
+
+if njit is None:
+    cell_members = _cell_members_numpy
+else:
+    # Not parallel: each page already gets its own worker process, and a table's few hundred chars are too few to
+    # pay for starting a thread pool in every one of them.
+    @njit(cache=True)
+    def _inside(bounds, boxes, i, j):
+        """True if char i lies fully within box j, by the same test as _cell_members_numpy."""
+        return (bounds[i, 0] >= boxes[j, 0] and bounds[i, 1] >= boxes[j, 1] and bounds[i, 2] <= boxes[j, 2]
+                and bounds[i, 3] <= boxes[j, 3] and (bounds[i, 2] - bounds[i, 0]) + (bounds[i, 3] - bounds[i, 1]) > 0)
+
+    @njit(cache=True)
+    def cell_members(bounds, boxes):
+        """Compiled equivalent of _cell_members_numpy. The chars in each box are counted in a first pass, so the
+        second can write them straight into that box's slice of order."""
+        ranges = np.zeros((len(boxes), 2), dtype=np.int64)
+        total = 0
+        for j in range(len(boxes)):
+            ranges[j, 0] = total
+            for i in range(len(bounds)):
+                if _inside(bounds, boxes, i, j):
+                    total += 1
+            ranges[j, 1] = total
+        order = np.empty(total, dtype=np.int64)
+        for j in range(len(boxes)):
+            slot = ranges[j, 0]
+            for i in range(len(bounds)):
+                if _inside(bounds, boxes, i, j):
+                    order[slot] = i
+                    slot += 1
+        return order, ranges
+
+
+def cells_text(chars, bounds, boxes, **kwargs):
+    """Returns the text of each cell, matching what `page.within_bbox(box).extract_text(**kwargs)` gives for it, or
+    None if the cell holds no chars.
+
+    :param chars: the list of char dicts to search, in the order `page.chars` lists them.
+    :param bounds: the bounding box of each char, in the same order as chars. See char_bounds.
+    :param boxes: the (x0, top, x1, bottom) bounding box of each cell.
+    :param kwargs: passed on to `pdfplumber.utils.extract_text`.
+    """
+    order, ranges = cell_members(bounds, np.asarray(boxes, dtype=np.float64).reshape(-1, 4))
+    return [utils.extract_text([chars[i] for i in order[start:end]], **kwargs) for start, end in ranges]
+
+
+def save_table_outputs(fname:pl.Path, bgr_pixels:np.ndarray, txt_fname:pl.Path, rows):
+    """Writes a table's image to fname as a PNG, and its text to txt_fname as one tab separated record per row. Cells
+    holding tabs, quotes or line breaks are quoted, so multi-line cells don't split their row."""
+    cv2.imwrite(str(fname), bgr_pixels, [cv2.IMWRITE_PNG_COMPRESSION, DEFAULT_PNG_COMPRESS_LEVEL])
+    buf = io.StringIO()
+    csv.writer(buf, dialect="excel-tab", lineterminator="\n").writerows(rows)
+    # encoded up front so characters the platform's default encoding can't represent are replaced rather than
+    # raising UnicodeEncodeError.
+    txt_fname.write_bytes(buf.getvalue().encode("utf-8", errors="replace"))
+
+
+def source_file_specific_logic(page, output_dir:pl.Path,page_num:int,io_pool:ThreadPoolExecutor=None,
+                               tables:List[Table]=None):
     """The code here is irrelevant to making the case for encapsulating image processing away from the pdf processing.
 
     The expected output is that for each table in the source pdf, there will be a unique image in the ouptput dir, along
     with a unique text file mapping the entries on that table.
+
+    If io_pool is given, each table's files are written on it so that PNG encoding (which releases the GIL) overlaps
+    with the text extraction for the next table. We still wait for every write to finish before returning.
+
+    If tables is given, it is used in place of running page.find_tables() again.
     """
-    tables: List[Table] = page.find_tables()
+    if tables is None:
+        tables = page.find_tables()
+    if not tables:
+        return
+    # Pull the page's char coordinates out once, rather than re-cropping the whole page for every cell.
+    chars = page.chars
+    bounds = char_bounds(chars)
+    # the chars' indices ordered by their top, so each table can find the chars inside its vertical span with a
+    # binary search rather than testing every char on the page against its cells.
+    by_top = np.argsort(bounds[:, 1], kind="stable")
+    sorted_tops = bounds[by_top, 1]
+    # Rasterize the page once, each table's image is then just a slice of the page's pixels. Memory and PNG encoding
+    # costs grow with the square of the resolution, so we only go as high as the widest table needs.
+    widest_table = max(float(tbl.bbox[2] - tbl.bbox[0]) for tbl in tables)
+    resolution = min(RESOLUTION, int(72 * TABLE_IMAGE_WIDTH / widest_table))
+    page_image = page.to_image(resolution=resolution)
+    # cv2.imwrite expects BGR pixels. CV2PageImage already holds them that way; a PIL image's RGB pixels are copied out
+    # in BGR order once for the whole page, so no table slice needs its channels swapped on its own.
+    if isinstance(page_image, CV2PageImage):
+        page_pixels = page_image.original
+    else:
+        page_pixels = pil_to_bgr_ndarray(page_image.original)
+    # the page is only rendered once, above, each table's pixel box is worked out in floats from the page's scale.
+    page_x0, page_top = float(page.bbox[0]), float(page.bbox[1])
+    scale = float(page_image.scale)
+    pending = []
     for table_idx, tbl in enumerate(tables):
-        _table = page.within_bbox(tbl.bbox)
-        _table_image = _table.to_image(resolution=200)
-        header_boxes = [cell for cell in tbl.rows[0].cells if cell is not None]
-        # each cell in header_boxes is a 4-tuple containing the top-left and bottom-right x,y coordinates of
-        # that header. E.G.: header_boxes = [(x01,y01,x02,y02),(x11,y12,x13,y14),...,(xn1,yn1,xn2,yn2)]
-        # So, column_left_side_bounds = [x01,x11,...,xn1]
-        column_left_side_bounds = [cell[0] for cell in header_boxes]
-        column_left_side_bounds.append(header_boxes[-1][-2])
-        header_txt = [page.within_bbox(cell).extract_text() for cell in header_boxes]
-        name = f'{"_".join(header_txt)}_{page_num}_{table_idx}'
-        rows = [header_txt]
-        row: Row  # annotating type to enable Pycharm's auto-complete
-        for row in tbl.rows[1:]:
-            _row = []
-            for i, left_bound in enumerate(column_left_side_bounds[:-1], 1):
-                bbox = (left_bound, row.bbox[1], column_left_side_bounds[i], row.bbox[3])
-                try:
-                    _row.append(page.within_bbox(bbox).extract_text(x_tolerance=10, y_tolerance=10))
-                except TypeError as err:
-                    print(f"{type(err)}: {err.args}\n\twhen creating the string sequence for: {name} at {bbox}")
-            rows.append(_row)
-        _table_image.annotated = cv2.cvtColor(np.array(_table_image.annotated), cv2.COLOR_RGB2BGR)
-        try:
-            name_fixed = name.replace("  ", "-").replace(".", "_").replace(" ", "-")
-            fname = output_dir.joinpath(f"alt_{name_fixed}.png").resolve()
-            _table_image.save(str(fname))
-            txt_fname = output_dir.joinpath(f"alt_{name_fixed}.txt").resolve()
-            with open(str(txt_fname), "w") as f:
-                f.write("\n".join(str(row) for row in rows))
-        except UnicodeEncodeError as uee:
-            print(f"{type(uee)}: {uee.args}\n\tfor table: {name}")
+        x0, top, x1, bottom = map(float, tbl.bbox)
+        px0, px1 = int((x0 - page_x0) * scale), int((x1 - page_x0) * scale)
+        py0, py1 = int((top - page_top) * scale), int((bottom - page_top) * scale)
+        table_pixels = page_pixels[py0:py1, px0:px1]
+        table_rows = tbl.rows
+        # each row of header_arr holds the top-left and bottom-right x,y coordinates of one header cell, ordered from
+        # left to right. E.G.: header_arr = [[x01,y01,x02,y02],[x11,y12,x13,y14],...,[xn1,yn1,xn2,yn2]]
+        # So, column_left_side_bounds = [x01,x11,...,xn1,xn2], closing off the last column with its right side.
+        # Row.cells holds None wherever the header row has no cell at one of the table's x positions.
+        header_arr = np.array([cell for cell in table_rows[0].cells if cell is not None], dtype=np.float64)
+        column_left_side_bounds = np.concatenate([header_arr[:, 0], header_arr[-1:, 2]])
+        lo, hi = np.searchsorted(sorted_tops, top, side="left"), np.searchsorted(sorted_tops, bottom, side="right")
+        # sorted back into the page's order, which within_bbox keeps and extract_text's line clustering relies on.
+        in_table = np.sort(by_top[lo:hi])
+        table_chars = [chars[i] for i in in_table]
+        table_bounds = bounds[in_table]
+        # headers are read from their own cells with extract_text's default tolerances. The body is read column by
+        # column across each row's full height, so a row that overlaps the one below it, as rows holding a merged
+        # cell do, shares the chars in the overlap with it.
+        header_txt = [txt or "" for txt in cells_text(table_chars, table_bounds, header_arr)]
+        row_spans = np.array([row.bbox[1::2] for row in table_rows[1:]], dtype=np.float64).reshape(-1, 2)
+        n_cols = len(column_left_side_bounds) - 1
+        body_boxes = np.empty((len(row_spans), n_cols, 4))
+        body_boxes[:, :, 0] = column_left_side_bounds[:-1]
+        body_boxes[:, :, 2] = column_left_side_bounds[1:]
+        body_boxes[:, :, 1] = row_spans[:, :1]
+        body_boxes[:, :, 3] = row_spans[:, 1:]
+        body_txt = cells_text(table_chars, table_bounds, body_boxes, x_tolerance=10, y_tolerance=10)
+        rows = [header_txt] + [body_txt[i:i + n_cols] for i in range(0, len(body_txt), n_cols)]
+        name_fixed = f"{header_file_stem(tuple(header_txt))}_{page_num}_{table_idx}"
+        fname = output_dir / f"alt_{name_fixed}.png"
+        txt_fname = output_dir / f"alt_{name_fixed}.txt"
+        save_args = (fname, table_pixels, txt_fname, rows)
+        if io_pool is None:
+            save_table_outputs(*save_args)
+        else:
+            pending.append(io_pool.submit(save_table_outputs, *save_args))
+    for future in pending:
+        future.result()
+
+
+def process_page(pdf_path:pl.Path, page_num:int, page_image_type, output_dir:pl.Path, table_cells=None):
+    """Worker for the demo's process pool. pdfplumber/pdfminer objects can't be pickled, so each worker re-opens the
+    pdf, asking it to parse only the page that worker was assigned.
+
+    :param pdf_path: path to the source pdf.
+    :param page_num: zero-based index of the page to process.
+    :param page_image_type: the BasePageImage subclass the pdf should use when rendering images.
+    :param output_dir: directory the table images and text files are written to.
+    :param table_cells: [optional] the cells of each table on the page, as returned by a previous call. When given,
+                        the tables are rebuilt from them instead of running page.find_tables() again.
+    :return: the cells of each table found on the page.
+    """
+    # pdf: PDF  # annotating type to enable Pycharm's auto-complete
+    with PDF.open(pdf_path, pages=[page_num + 1], page_image_type=page_image_type) as pdf, \
+            ThreadPoolExecutor(max_workers=IO_WORKERS) as io_pool:
+        page = pdf.pages[0]
+        if table_cells is None:
+            tables = page.find_tables()
+        else:
+            tables = [Table(page, cells) for cells in table_cells]
+        source_file_specific_logic(page, output_dir, page_num, io_pool, tables)
+        # workers are reused for many pages, so don't hold on to this page's layout objects.
+        page.flush_cache()
+    return [tbl.cells for tbl in tables]
+
+
+def load_table_cache(cache_file:pl.Path, pdf_key:tuple)->dict:
+    """Returns the {page_num: table_cells} mapping saved by a previous run over the same pdf, or an empty dict if there
+    isn't one, or if the pdf has changed since it was saved."""
+    try:
+        with open(cache_file, "rb") as f:
+            saved_key, table_cache = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        return {}
+    return table_cache if saved_key == pdf_key else {}
 
 
 def demo(pdf_path:pl.Path,page_image_type,output_dir_name:str):
     output_dir = pl.Path("./demo_output").resolve().joinpath(output_dir_name)
     output_dir.mkdir(parents=True,exist_ok=True)
     print(f"sample outputs will be saved to:\n\t{output_dir}")
+    # find_tables is the most expensive step per page, and its results don't depend on the page image type, so
+    # they're kept next to the output directories for later runs over the same pdf.
+    cache_file = output_dir.parent / f".tables_cache_{pdf_path.stem}.pkl"
     def inner():
-        # pdf: PDF  # annotating type to enable Pycharm's auto-complete
+        pdf_stat = pl.Path(pdf_path).stat()
+        pdf_key = (pdf_stat.st_mtime_ns, pdf_stat.st_size)
+        table_cache = load_table_cache(cache_file, pdf_key)
         with PDF.open(pdf_path, page_image_type=page_image_type) as pdf:
-            # page: Page # annotating type to enable Pycharm's auto-complete
-            for page_num, page in enumerate(pdf.pages):
-                source_file_specific_logic(page,output_dir,page_num)
+            # only needs the page tree, each page's contents are parsed lazily by the worker it's assigned to.
+            page_count = len(pdf.pages)
+        # each page writes its own images and text files, so the pages can be processed independently of each other.
+        # Every worker process pays for its own interpreter start up and imports, so none are started beyond one per
+        # page.
+        with ProcessPoolExecutor(max_workers=max(1, min(os.cpu_count() or 1, page_count))) as executor:
+            futures = {page_num: executor.submit(process_page, pdf_path, page_num, page_image_type, output_dir,
+                                                 table_cache.get(page_num))
+                       for page_num in range(page_count)}
+            updated_cache = {page_num: future.result() for page_num, future in futures.items()}
+        if updated_cache != table_cache:
+            with open(cache_file, "wb") as f:
+                pickle.dump((pdf_key, updated_cache), f)
     return inner
 
 
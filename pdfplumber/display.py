@@ -3,9 +3,13 @@ from .table import TableFinder
 
 import PIL.Image
 import PIL.ImageDraw
-import wand.image
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 from io import BytesIO
 import pathlib as pl
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class COLORS(object):
@@ -19,13 +23,58 @@ DEFAULT_FILL = COLORS.BLUE + (50,)
 DEFAULT_STROKE = COLORS.RED + (200,)
 DEFAULT_STROKE_WIDTH = 1
 DEFAULT_RESOLUTION = 72
+# zlib level 1 encodes several times faster than PIL's default of 6, for
+# slightly larger files.
+DEFAULT_PNG_COMPRESS_LEVEL = 1
+# A tiny fraction of a pixel that reprojected coordinates are nudged up by. See BasePageImage.__init__.
+_PIXEL_NUDGE = 1e-9
 
 image_handler_types = {}
 
+# The AbstractImageHandler methods and property setters that change the images. See AbstractImageHandler.version.
+_MUTATING_METHODS = ("reset", "crop_original", "line", "rectangle", "ellipse", "lines", "rectangles", "ellipses")
+_MUTATING_SETTERS = ("original_image", "annotated_image")
+
+
+def _bumps_version(method):
+    """Wraps an image handler method so that every call to it bumps the handler's version first."""
+    @wraps(method)
+    def bumped(self, *args, **kwargs):
+        self._version += 1
+        return method(self, *args, **kwargs)
+    bumped.bumps_version = True
+    return bumped
+
+
+def _wrap_mutators(cls):
+    """Wraps the mutating methods and property setters that cls defines itself with _bumps_version."""
+    for name in _MUTATING_METHODS:
+        method = cls.__dict__.get(name)
+        if method is not None and not getattr(method, "bumps_version", False):
+            setattr(cls, name, _bumps_version(method))
+    for name in _MUTATING_SETTERS:
+        prop = cls.__dict__.get(name)
+        if isinstance(prop, property) and prop.fset is not None and not getattr(prop.fset, "bumps_version", False):
+            setattr(cls, name, prop.setter(_bumps_version(prop.fset)))
+
+
+def _as_sequence(collection):
+    """
+    Like utils.to_list, but lists and tuples are returned as they are
+    rather than copied, since the drawing methods only iterate over them.
+    """
+    if isinstance(collection, (list, tuple)):
+        return collection
+    return utils.to_list(collection)
+
+
 def get_page_image(stream, page_no, resolution):
     """
     For kwargs, see http://docs.wand-py.org/en/latest/wand/image.html#wand.image.Image
     """
+    # wand loads ImageMagick when it's imported, so that cost is only paid
+    # once a page is actually rasterized.
+    import wand.image
 
     # If we are working with a file object saved to disk
     if hasattr(stream, "name"):
@@ -47,13 +96,32 @@ def get_page_image(stream, page_no, resolution):
         if img.alpha_channel:
             img.background_color = wand.image.Color("white")
             img.alpha_channel = "background"
-        with img.convert("png") as png:
-            im = PIL.Image.open(BytesIO(png.make_blob()))
-            if "transparency" in im.info:
-                converted = im.convert("RGBA").convert("RGB")
-            else:
-                converted = im.convert("RGB")
-            return converted
+        # Hand the raw 8-bit RGB pixels straight to PIL, rather than encoding
+        # the page as a PNG only to have PIL decode it again. The alpha channel
+        # was flattened onto white above, so RGB is all we need.
+        img.depth = 8
+        blob = img.make_blob(format="RGB")
+        return PIL.Image.frombuffer("RGB", img.size, blob, "raw", "RGB", 0, 1)
+
+
+def rasterize_pages(stream, page_nos, resolution=DEFAULT_RESOLUTION, max_workers=1):
+    """
+    Rasterize several pages with get_page_image, returning their images in
+    the order of page_nos. By default the pages are rendered one at a time.
+    ImageMagick releases the GIL while it renders, so passing max_workers > 1
+    spreads them over a thread pool of that many threads instead. That's
+    opt-in, as it relies on the installed ImageMagick and Ghostscript being
+    safe to call from several threads at once.
+    """
+    page_nos = list(page_nos)
+    # get_page_image seeks and reads an in-memory stream itself, which
+    # threads sharing the stream can't do safely.
+    if max_workers == 1 or not hasattr(stream, "name"):
+        return [get_page_image(stream, n, resolution) for n in page_nos]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(
+            executor.map(lambda n: get_page_image(stream, n, resolution), page_nos)
+        )
 
 
 class AbstractImageHandler:
@@ -75,6 +143,15 @@ class AbstractImageHandler:
         annotated_image(self, value)
 
      """
+    # Subclasses that declare their own __slots__ store no per-instance __dict__ at all, which adds up when a handler
+    # is made per page or per table. Subclasses without __slots__ behave just as before.
+    __slots__ = ("_stream", "_page_num", "_resolution", "_original", "_annotated", "_version")
+
+    def __init_subclass__(cls, **kwargs):
+        # Overrides of the mutating methods bump the version without having to know it's there.
+        super().__init_subclass__(**kwargs)
+        _wrap_mutators(cls)
+
     def __init__(self, stream, page_no, resolution,
                  optional_source_handler=None) -> None:
         """ImageHandler instances will be created in the same way that images used to be
@@ -82,6 +159,7 @@ class AbstractImageHandler:
         self._stream = stream
         self._page_num = page_no
         self._resolution = resolution
+        self._version = 0
         if optional_source_handler is not None:
             self._original = optional_source_handler.original_image
             self._annotated = optional_source_handler.annotated_image
@@ -93,6 +171,16 @@ class AbstractImageHandler:
     def draw(self):
         return self
 
+    @property
+    def version(self):
+        """A count that goes up every time one of the methods or property setters that change the images is called,
+        so anything derived from the images, like BasePageImage's cached PNG, can tell whether it's still current.
+        Subclasses get this for free; their overrides of those methods are wrapped when the subclass is created.
+
+        Drawing on the image that annotated_image or draw hands out isn't seen, callers that do so must not trust it.
+        """
+        return self._version
+
     @property
     def stream(self):
         return self._stream
@@ -163,32 +251,75 @@ class AbstractImageHandler:
         """
         raise NotImplementedError("AbstractImageHandler.crop_original(cropbox,**kwargs)")
 
+    @property
+    def unannotated_mode(self):
+        """The mode the annotated image was last reset to, if nothing has been drawn on it since, otherwise None.
+        While this isn't None, the annotated image is fully determined by the original image and this mode.
+
+        The default of None is always safe; subclasses return something hashable once they can tell."""
+        return None
+
     def line(self,points,color,width,**kwargs):
         """given a sequence of x,y point data for a start point and an end point, draw a line in the given color and
         width connecting those two points."""
         raise NotImplementedError("AbstractImageHandler.line(points_list,color,width,**kwargs)")
 
     def rectangle(self,bbox, color,outline_color,**kwargs):
+        """Draw a rectangle filled with color. Implementations should accept a `width` keyword giving the width of the
+        outline in pixels, centered on the edges of bbox, and default it to 1. A width of 0 draws no outline."""
         raise NotImplementedError("AbstractImageHandler.rectangle(top_left_pt, color,outline_color,**kwargs)")
 
     def ellipse(self, bbox, color, stroke,**kwargs):
         raise NotImplementedError("AbstractImageHandler.ellipse(bbox, color, stroke)")
 
+    def lines(self,list_of_points,color,width,**kwargs):
+        """Draw many line segments that share the same color and width. By default each segment is handed to `line`,
+        subclasses may override this if their image library can draw the whole batch more cheaply."""
+        for points in list_of_points:
+            self.line(points,color,width,**kwargs)
+
+    def rectangles(self,bboxes,color,outline_color,**kwargs):
+        """Draw many rectangles that share the same colors. By default each bbox is handed to `rectangle`."""
+        for bbox in bboxes:
+            self.rectangle(bbox,color,outline_color,**kwargs)
+
+    def ellipses(self,bboxes,color,stroke,**kwargs):
+        """Draw many ellipses that share the same colors. By default each bbox is handed to `ellipse`."""
+        for bbox in bboxes:
+            self.ellipse(bbox,color,stroke,**kwargs)
+
+
+_wrap_mutators(AbstractImageHandler)
+
 
 class PILImageHandler(AbstractImageHandler):
 
     def __init__(self,*args, **kwargs) -> None:
         super().__init__(*args,**kwargs)
-        if self.original_image is None:
-            self.original_image = get_page_image(self.stream,self.page_number,self.resolution)
-        if self.annotated_image is not None:
-            self._pil_draw = PIL.ImageDraw.Draw(self.annotated_image, "RGBA")
+        # The annotated image that reset() last allocated, until it's handed out through annotated_image or draw. Only
+        # that image is ever reused by reset(), since images the caller holds, was given through annotated_image, or
+        # that are shared from an optional_source_handler, may still be referenced elsewhere.
+        self._reset_image = None
+        # The image mode requested by the last reset() that hasn't been applied yet. The annotated image is only
+        # rebuilt from the original once something actually needs it, so renders without any annotations never
+        # pay for a copy of the page.
+        self._pending_mode = None
+        if self._original is None:
+            # The page is only rasterized once its pixels are first asked for, see the original_image getter.
+            # get_page_image always returns an RGB image, so the reset that follows it can be scheduled already.
+            self._pending_mode = "RGB"
+        if self._annotated is not None:
+            self._pil_draw = PIL.ImageDraw.Draw(self._annotated, "RGBA")
 
     @property
     def draw(self):
         """returns a reference to the PIL.ImageDraw.ImageDraw for the annotated image.
 
         :return: PIL.ImageDraw.ImageDraw"""
+        if self._pending_mode is not None:
+            self._apply_reset()
+        # the caller can draw on the image through this from now on, so the next reset mustn't paste over it.
+        self._reset_image = None
         return self._pil_draw
 
     @property
@@ -197,6 +328,8 @@ class PILImageHandler(AbstractImageHandler):
          as a PIL.Image.Image instance.
 
         :return: PIL.Image.Image"""
+        if self._original is None:
+            self._original = get_page_image(self.stream,self.page_number,self.resolution)
         return self._original
 
     @original_image.setter
@@ -204,9 +337,7 @@ class PILImageHandler(AbstractImageHandler):
         if isinstance(image_or_mode, PIL.Image.Image):
             self._original = image_or_mode
         elif isinstance(image_or_mode, str):
-            tmp = PIL.Image.new(image_or_mode, self._original.size)
-            tmp.paste(self._original)
-            self._original = tmp
+            self._original = self.original_image.convert(image_or_mode)
         else:
             raise ValueError("from PILImageHandler.original_image setter, image_mode_or_page is not an instance of:"
                              "\n\tPIL.Image.Image, or string")
@@ -217,28 +348,36 @@ class PILImageHandler(AbstractImageHandler):
         """Returns a reference to the annotated copy of the original image.
 
         :return: PIL.Image.Image"""
+        annotated = self._current_annotated()
+        # the caller holds the image from now on, so the next reset mustn't paste over it.
+        self._reset_image = None
+        return annotated
+
+    def _current_annotated(self):
+        """The annotated image, as the annotated_image getter returns it, for use within the handler itself."""
+        if self._pending_mode is not None:
+            self._apply_reset()
         if self._annotated is None:
-            self._annotated = self._original.copy()
+            self._annotated = self.original_image.copy()
         return self._annotated
 
     @annotated_image.setter
     def annotated_image(self, image_or_mode):
+        self._pending_mode = None
         if isinstance(image_or_mode,PIL.Image.Image):
             self._annotated = image_or_mode
-            self._pil_draw = PIL.ImageDraw.Draw(self._annotated, self._annotated.mode)
-        elif isinstance(image_or_mode,(str or pl.Path)):
-            if isinstance(image_or_mode,pl.Path):
-                image_or_mode = str(image_or_mode.resolve())
-            self._annotated = PIL.Image.new(image_or_mode, self._original.size)
-            self._annotated.paste(self._original)
-            self._pil_draw = PIL.ImageDraw.Draw(self._annotated, image_or_mode)
+        elif isinstance(image_or_mode,str):
+            self._annotated = self.original_image.convert(image_or_mode)
+        elif isinstance(image_or_mode,pl.Path):
+            self._annotated = PIL.Image.open(image_or_mode)
+        elif hasattr(image_or_mode,"__array_interface__"):
+            # something like a numpy array
+            self._annotated = PIL.Image.fromarray(image_or_mode)
         else:
-            # image_or_mode isn't a PIL.Image.Image, nor is it a path any sort.
-            # It's either a byte array, or something like a numpy array.
-            try:
-                self._annotated = PIL.Image.fromarray(image_or_mode)
-            except:
-                self._annotated = PIL.Image.frombuffer(self._annotated.mode,self._annotated.size,image_or_mode)
+            # raw pixel bytes, laid out like the image they replace
+            current = self._annotated if self._annotated is not None else self.original_image
+            self._annotated = PIL.Image.frombuffer(current.mode,current.size,image_or_mode,"raw",current.mode,0,1)
+        self._pil_draw = PIL.ImageDraw.Draw(self._annotated, self._annotated.mode)
 
     @property
     def size(self)->tuple:
@@ -246,7 +385,12 @@ class PILImageHandler(AbstractImageHandler):
         Subclass implementations may choose to pass specifying parameters calling for the size of
         the annotated image, or possibly the contiguous memory size of the images.
         """
-        return self._original.size
+        return self.original_image.size
+
+    @property
+    def unannotated_mode(self):
+        # a reset is only applied once something is drawn, see _apply_reset.
+        return self._pending_mode
 
     def save(self, fp, format=None, *args, **params):
         """Saves the annotated image to the given fp object (a bytes buffer or bytes files), in the given format,
@@ -257,17 +401,33 @@ class PILImageHandler(AbstractImageHandler):
            format to use is determined from the filename extension.
            If a file object was used instead of a filename, this
            parameter should always be used.
-        :param params: Extra parameters to the image writer.
+        :param params: Extra parameters to the image writer. PNGs are written with compress_level=1
+           unless another level is given.
         :returns: None
         :exception ValueError: If the output format could not be determined
            from the file name.  Use the format option to solve this.
         :exception OSError: If the file could not be written.  The file
            may have been created, and may contain partial data."""
+        if format is not None:
+            is_png = format.upper() == "PNG"
+        else:
+            # PIL works the format out from the file's name in the same way.
+            name = fp if isinstance(fp, (str, pl.Path)) else getattr(fp, "name", "")
+            is_png = str(name).lower().endswith(".png")
+        if is_png:
+            # zlib's default level is much slower to encode than level 1, for a modest saving in file size.
+            params.setdefault("compress_level", DEFAULT_PNG_COMPRESS_LEVEL)
         try:
-            self._annotated.save(fp,format,**params)
+            original = self.original_image
+            if self._pending_mode == original.mode:
+                # Nothing has been drawn since the last reset, so the original already looks exactly like the
+                # annotated image would.
+                original.save(fp,format,**params)
+            else:
+                self._current_annotated().save(fp,format,**params)
             return True
         except BaseException as be:
-            print(f"PILImageHandler.save encountered {type(be)}: {be.args}")
+            logger.warning("PILImageHandler.save encountered %s: %s", type(be), be.args)
             return False
 
     def reset(self, mode=None, **kwargs):
@@ -278,10 +438,30 @@ class PILImageHandler(AbstractImageHandler):
         :param kwargs: [optional] allows safe customization of method signature in image-handler subclasses.
         """
         if mode is None:
-            mode = self._original.mode
-        self._annotated = PIL.Image.new(mode,self._original.size)
-        self._annotated.paste(self._original)
+            mode = self.original_image.mode
+        self._pending_mode = mode
+
+    def _apply_reset(self):
+        """Rebuild the annotated image from the original, in the mode requested by the last call to reset."""
+        mode = self._pending_mode
+        self._pending_mode = None
+        original = self.original_image
+        reusable = self._reset_image
+        if (
+            reusable is not None
+            and self._annotated is reusable
+            and reusable.mode == mode
+            and reusable.size == original.size
+        ):
+            # Pasting the original over the whole image clears any annotations, and the existing ImageDraw
+            # is still bound to it, so there's nothing to reallocate.
+            reusable.paste(original)
+            return
+        # convert/copy write straight into a fresh buffer, where Image.new would zero-fill it only to have paste
+        # overwrite every pixel.
+        self._annotated = original.convert(mode) if mode != original.mode else original.copy()
         self._pil_draw = PIL.ImageDraw.Draw(self._annotated, mode)
+        self._reset_image = self._annotated
 
     def crop_original(self, cropbox, **kwargs):
         """Given cropbox -- a sequence of 4 points -- crop the image data down to a box with vertices at those 4 points.
@@ -291,7 +471,7 @@ class PILImageHandler(AbstractImageHandler):
         the area of the current original image.
         :param kwargs: [optional] allows safe customization of method signature in image-handler subclasses.
         """
-        self._original = self._original.crop(cropbox)
+        self._original = self.original_image.crop(cropbox)
         self.reset()
 
     def line(self, points, color, width, **kwargs):
@@ -305,19 +485,22 @@ class PILImageHandler(AbstractImageHandler):
         :param kwargs: additional parameters that have no use in this implementation, but subclasses may need.
         :return:
         """
+        if self._pending_mode is not None:
+            self._apply_reset()
         self._pil_draw.line(points, fill=color, width=width)
 
-    def rectangle(self, bbox, color, outline_color, **kwargs):
+    def rectangle(self, bbox, color, outline_color, width=1, **kwargs):
         """Draw a rectangle on the annotated image.
 
         :param bbox: 2-tuple of x,y point coordinates, or a 4-tuple as (x0,y0,x1,y1). These points define 2 opposing
                     corners of the bounding box. Should be the top-left corner and bottom-right corners respectively.
         :param color:
         :param outline_color:
+        :param width: how many pixels wide the outline should be, centered on the edges of bbox. 0 draws no outline.
         :param kwargs:
         :return:
         """
-        self._pil_draw.rectangle(bbox, fill=color, outline=outline_color)
+        self.rectangles([bbox], color, outline_color, width=width)
 
     def ellipse(self, bbox, color, stroke, **kwargs):
         """Draws an ellipse on the annotated image.
@@ -329,13 +512,80 @@ class PILImageHandler(AbstractImageHandler):
         :param kwargs: optional keyword arguments, not used in this implementation but subclasses may have a need.
         :return: None
         """
+        if self._pending_mode is not None:
+            self._apply_reset()
         self._pil_draw.ellipse(bbox, fill=color, outline=stroke)
 
+    def lines(self, list_of_points, color, width, **kwargs):
+        """Draws every line segment in list_of_points on the annotated image, with the same color and width.
+
+        :param list_of_points: a sequence of line segments, each in any form accepted by `line`.
+        :param color: the color to use for every line
+        :param width: an int defining how many pixels wide the lines should be
+        :param kwargs: additional parameters that have no use in this implementation, but subclasses may need.
+        :return: None
+        """
+        if self._pending_mode is not None:
+            self._apply_reset()
+        draw_line = self._pil_draw.line
+        for points in list_of_points:
+            draw_line(points, fill=color, width=width)
+
+    def rectangles(self, bboxes, color, outline_color, width=1, **kwargs):
+        """Draws every rectangle in bboxes on the annotated image, with the same fill and outline colors.
+
+        :param bboxes: a sequence of bounding boxes, each in any form accepted by `rectangle`.
+        :param color: the color to fill the rectangles with
+        :param outline_color: the color to use for the rectangles' outlines
+        :param width: how many pixels wide the outlines should be, centered on the edges of each bbox. 0 draws no
+                      outlines.
+        :param kwargs: additional parameters that have no use in this implementation, but subclasses may need.
+        :return: None
+        """
+        if self._pending_mode is not None:
+            self._apply_reset()
+        draw_rectangle = self._pil_draw.rectangle
+        draw_line = self._pil_draw.line
+        for bbox in bboxes:
+            if len(bbox) == 2:
+                (x0, top), (x1, bottom) = bbox
+            else:
+                x0, top, x1, bottom = bbox
+            # PIL fills inside a rectangle's outline, so the transparent one keeps the fill a pixel in from each of
+            # bbox's edges, as draw_rect has always drawn it.
+            draw_rectangle((x0, top, x1, bottom), fill=color, outline=COLORS.TRANSPARENT)
+            if width > 0:
+                # Each edge is its own line, rather than the rectangle's outline, which PIL draws inward from bbox and
+                # only as wide as a whole number of pixels from each corner.
+                draw_line(((x0, top), (x1, top)), fill=outline_color, width=width)
+                draw_line(((x0, bottom), (x1, bottom)), fill=outline_color, width=width)
+                draw_line(((x0, top), (x0, bottom)), fill=outline_color, width=width)
+                draw_line(((x1, top), (x1, bottom)), fill=outline_color, width=width)
+
+    def ellipses(self, bboxes, color, stroke, **kwargs):
+        """Draws every ellipse in bboxes on the annotated image, with the same fill and outline colors.
+
+        :param bboxes: a sequence of bounding boxes, each in any form accepted by `ellipse`.
+        :param color: the color to fill the ellipses with
+        :param stroke: the color to use for the ellipses' outlines
+        :param kwargs: additional parameters that have no use in this implementation, but subclasses may need.
+        :return: None
+        """
+        if self._pending_mode is not None:
+            self._apply_reset()
+        draw_ellipse = self._pil_draw.ellipse
+        for bbox in bboxes:
+            draw_ellipse(bbox, fill=color, outline=stroke)
+
 
 image_handler_types["PIL"] = PILImageHandler
 
 
 class BasePageImage(object):
+    # See AbstractImageHandler.__slots__.
+    __slots__ = ("_valid_image_formats", "page", "_img_type", "_image_handler", "_png_cache", "_png_cacheable",
+                 "_unannotated_png", "_original_held", "decimalize", "root", "scale", "_scale_f", "_dx", "_dy")
+
     def __init__(self, page, original=None, resolution=DEFAULT_RESOLUTION,image_handler_type: str or AbstractImageHandler = None):
         resolution = resolution if resolution is not None else DEFAULT_RESOLUTION
         self._valid_image_formats = {"RGBA","RGB"}
@@ -345,6 +595,14 @@ class BasePageImage(object):
         else:
             self._img_type = type(original)
         self._image_handler = self._img_type(page.pdf.stream, page.page_number, resolution, original)
+        # (handler version, PNG) of the last image _repr_png_ encoded.
+        self._png_cache = None
+        # False once the caller holds something it could draw with, see _repr_png_.
+        self._png_cacheable = True
+        # (mode, PNG) of the image as it looks right after a reset to that mode, kept across resets, see _repr_png_.
+        self._unannotated_png = None
+        # True once the caller holds the original image, which it could change in place at any time.
+        self._original_held = False
         d = self.page.decimalize
         self.decimalize = d
         if page.is_original:
@@ -354,28 +612,52 @@ class BasePageImage(object):
             self.root = page.root_page
             cropped = page.root_page.bbox != page.bbox
         self.scale = d(self._image_handler.size[0]) / d(self.root.width)
+        # Reprojecting from the root page's coordinates to the image's is the
+        # same affine transform for every point, so its terms are worked out
+        # once here, as floats.
+        self._scale_f = float(self.scale)
+        # Where the Decimal math landed exactly on a whole pixel, floats can
+        # land a hair under it, and PIL truncates coordinates to whole pixels.
+        # So the offsets carry a nudge of _PIXEL_NUDGE pixels, far too small to
+        # move a coordinate that wasn't meant to be whole.
+        nudge = _PIXEL_NUDGE / self._scale_f
+        self._dx = float(self.root.bbox[0] - page.bbox[0]) + nudge
+        self._dy = float(self.root.bbox[1] - page.bbox[1]) + nudge
         if cropped:
-            cropbox = map(int,(
-                (page.bbox[0] - page.root_page.bbox[0]) * self.scale,
-                (page.bbox[1] - page.root_page.bbox[1]) * self.scale,
-                (page.bbox[2] - page.root_page.bbox[0]) * self.scale,
-                (page.bbox[3] - page.root_page.bbox[1]) * self.scale,
-            ))
+            scale = self._scale_f
+            root_x0, root_top = float(self.root.bbox[0]), float(self.root.bbox[1])
+            x0, top, x1, bottom = map(float, page.bbox)
+            cropbox = (
+                int((x0 - root_x0) * scale),
+                int((top - root_top) * scale),
+                int((x1 - root_x0) * scale),
+                int((bottom - root_top) * scale),
+            )
             self._image_handler.crop_original(cropbox)
-            # self.original = self.original.crop(map(int, cropbox))
         self.reset()
 
     @property
     def original(self):
         """returns a pointer to the original image data as taken straight from the source page (possibly cropped)"""
+        self._hold_original()
         return self._image_handler.original_image
 
     @original.setter
     def original(self, value):
+        # the caller may still hold the image it gave us.
+        self._hold_original()
         self._image_handler.original_image = value
 
+    def _hold_original(self):
+        # Every PNG depends on the original, so with the caller able to change it in place, none can be cached.
+        self._original_held = True
+        self._png_cacheable = False
+        self._unannotated_png = None
+
     @property
     def annotated(self):
+        # The caller may draw on the image we hand out at any time, so PNGs can't be cached until the next reset.
+        self._png_cacheable = False
         return self._image_handler.annotated_image
 
     @annotated.setter
@@ -390,45 +672,58 @@ class BasePageImage(object):
         :return: None
         :rtype: None
         """
+        # the caller may still hold the image it gave us, see the annotated getter.
+        self._png_cacheable = False
         self._image_handler.annotated_image = image_or_mode
 
     @property
     def draw(self):
         """A backwards compatability method for any user code that directly utlized the PageImage.draw member."""
+        # see the annotated getter.
+        self._png_cacheable = False
         return self._image_handler.draw
 
     def _reproject_bbox(self, bbox):
         x0, top, x1, bottom = bbox
-        _x0, _top = self._reproject((x0, top))
-        _x1, _bottom = self._reproject((x1, bottom))
-        return (_x0, _top, _x1, _bottom)
+        dx, dy, scale = self._dx, self._dy, self._scale_f
+        return (
+            (float(x0) + dx) * scale,
+            (float(top) + dy) * scale,
+            (float(x1) + dx) * scale,
+            (float(bottom) + dy) * scale,
+        )
 
     def _reproject(self, coord):
         """
         Given an (x0, top) tuple from the *root* coordinate system,
         return an (x0, top) tuple in the *image* coordinate system.
         """
-        x0, top = coord
-        px0, ptop = self.page.bbox[:2]
-        rx0, rtop = self.root.bbox[:2]
-        _x0 = (x0 + rx0 - px0) * self.scale
-        _top = (top + rtop - ptop) * self.scale
-        return (_x0, _top)
+        scale = self._scale_f
+        return ((float(coord[0]) + self._dx) * scale, (float(coord[1]) + self._dy) * scale)
+
+    def _reproject_many(self, coords):
+        """
+        Same as _reproject, for a whole sequence of (x0, top) tuples at once.
+        """
+        dx, dy, scale = self._dx, self._dy, self._scale_f
+        return [((float(x0) + dx) * scale, (float(top) + dy) * scale) for x0, top in coords]
 
     def reset(self):
         # self.annotated = PIL.Image.new(self.original.mode, self.original.size)
         # self.annotated.paste(self.original)
         # self.draw = PIL.ImageDraw.Draw(self.annotated, "RGBA")
         # updated for encapsulation of image manipulation
+        # anything the caller held draws on the image from before the reset, not on the new one. The original is
+        # the exception, it's still the one the caller holds.
+        self._png_cacheable = not self._original_held
         self._image_handler.reset("RGBA")  # can also just pass None
         return self
 
     def copy(self):
         return self.__class__(self.page, self._image_handler,self._image_handler.resolution)
 
-    def draw_line(
-            self, points_or_obj, stroke=DEFAULT_STROKE, stroke_width=DEFAULT_STROKE_WIDTH
-    ):
+    def _line_points(self, points_or_obj):
+        """Returns the end-points of a line, given as points or as a pdfplumber object, in the image's coordinates."""
         if isinstance(points_or_obj, (tuple, list)):
             points = points_or_obj
         elif type(points_or_obj) == dict and "points" in points_or_obj:
@@ -436,13 +731,23 @@ class BasePageImage(object):
         else:
             obj = points_or_obj
             points = ((obj["x0"], obj["top"]), (obj["x1"], obj["bottom"]))
+        return self._reproject_many(points)
+
+    def draw_line(
+            self, points_or_obj, stroke=DEFAULT_STROKE, stroke_width=DEFAULT_STROKE_WIDTH
+    ):
         # updated for encapsulation of image manipulation
-        self._image_handler.line(list(map(self._reproject, points)), color=stroke, width=stroke_width)
+        self._image_handler.line(self._line_points(points_or_obj), color=stroke, width=stroke_width)
         return self
 
-    def draw_lines(self, list_of_lines, **kwargs):
-        for x in utils.to_list(list_of_lines):
-            self.draw_line(x, **kwargs)
+    def draw_lines(
+            self, list_of_lines, stroke=DEFAULT_STROKE, stroke_width=DEFAULT_STROKE_WIDTH
+    ):
+        # Every line shares the same style, so they're handed to the image handler as a single batch.
+        line_points = self._line_points
+        self._image_handler.lines(
+            [line_points(x) for x in _as_sequence(list_of_lines)], color=stroke, width=stroke_width
+        )
         return self
 
     def draw_vline(
@@ -450,13 +755,14 @@ class BasePageImage(object):
     ):
         points = (location, self.page.bbox[1], location, self.page.bbox[3])
         # updated for encapsulation of image manipulation
-        self._image_handler.line(list(map(self._reproject, points)), color=stroke, width=stroke_width)
+        self._image_handler.line(self._reproject_bbox(points), color=stroke, width=stroke_width)
         return self
 
     def draw_vlines(self, locations, **kwargs):
-        for x in utils.to_list(locations):
-            self.draw_vline(x, **kwargs)
-        return self
+        top, bottom = self.page.bbox[1], self.page.bbox[3]
+        return self.draw_lines(
+            [((x, top), (x, bottom)) for x in _as_sequence(locations)], **kwargs
+        )
 
     def draw_hline(
             self, location, stroke=DEFAULT_STROKE, stroke_width=DEFAULT_STROKE_WIDTH
@@ -466,9 +772,10 @@ class BasePageImage(object):
         return self
 
     def draw_hlines(self, locations, **kwargs):
-        for x in utils.to_list(locations):
-            self.draw_hline(x, **kwargs)
-        return self
+        x0, x1 = self.page.bbox[0], self.page.bbox[2]
+        return self.draw_lines(
+            [((x0, y), (x1, y)) for y in _as_sequence(locations)], **kwargs
+        )
 
     def draw_rect(
             self,
@@ -477,54 +784,81 @@ class BasePageImage(object):
             stroke=DEFAULT_STROKE,
             stroke_width=DEFAULT_STROKE_WIDTH,
     ):
-        if isinstance(bbox_or_obj, (tuple, list)):
-            bbox = bbox_or_obj
-        else:
-            obj = bbox_or_obj
-            bbox = (obj["x0"], obj["top"], obj["x1"], obj["bottom"])
+        return self.draw_rects([bbox_or_obj], fill=fill, stroke=stroke, stroke_width=stroke_width)
 
-        x0, top, x1, bottom = bbox
-        half = self.decimalize(stroke_width / 2)
-        x0 += half
-        top += half
-        x1 -= half
-        bottom -= half
-
-        self._image_handler.rectangle(
-            self._reproject_bbox((x0, top, x1, bottom)), fill, COLORS.TRANSPARENT
-        )
-
-        if stroke_width > 0:
-            segments = [
-                ((x0, top), (x1, top)),  # top
-                ((x0, bottom), (x1, bottom)),  # bottom
-                ((x0, top), (x0, bottom)),  # left
-                ((x1, top), (x1, bottom)),  # right
-            ]
-            self.draw_lines(segments, stroke=stroke, stroke_width=stroke_width)
+    def draw_rects(
+            self,
+            list_of_rects,
+            fill=DEFAULT_FILL,
+            stroke=DEFAULT_STROKE,
+            stroke_width=DEFAULT_STROKE_WIDTH,
+    ):
+        # Everything below ends up as pixel coordinates, so the arithmetic is
+        # done in floats rather than Decimals.
+        scale = self._scale_f
+        lo_x, lo_y, hi_x, hi_y = self._rect_offsets(stroke_width)
+        bboxes = []
+        for bbox_or_obj in _as_sequence(list_of_rects):
+            if isinstance(bbox_or_obj, (tuple, list)):
+                x0, top, x1, bottom = map(float, bbox_or_obj)
+            else:
+                obj = bbox_or_obj
+                x0 = float(obj["x0"])
+                top = float(obj["top"])
+                x1 = float(obj["x1"])
+                bottom = float(obj["bottom"])
+            bboxes.append(
+                (x0 * scale + lo_x, top * scale + lo_y, x1 * scale + hi_x, bottom * scale + hi_y)
+            )
+        self._draw_pixel_rects(bboxes, fill, stroke, stroke_width)
         return self
 
-    def draw_rects(self, list_of_rects, **kwargs):
-        for x in utils.to_list(list_of_rects):
-            self.draw_rect(x, **kwargs)
-        return self
+    def _rect_offsets(self, stroke_width):
+        """
+        The (x0, top, x1, bottom) terms that draw_rects adds to a rect's
+        coordinates, once they're multiplied by the scale, to get its pixel
+        bbox.
+        """
+        half = stroke_width / 2
+        dx, dy, scale = self._dx, self._dy, self._scale_f
+        # The outline is centered on the rect's edges once they're inset by
+        # half a stroke. The inset and the reprojection are folded into these
+        # offsets so each rect costs just a few float ops.
+        return (
+            (dx + half) * scale,
+            (dy + half) * scale,
+            (dx - half) * scale,
+            (dy - half) * scale,
+        )
 
-    def draw_circle(
-            self, center_or_obj, radius=5, fill=DEFAULT_FILL, stroke=DEFAULT_STROKE
-    ):
+    def _draw_pixel_rects(self, bboxes, fill, stroke, stroke_width):
+        """
+        Hands bboxes, already in pixel coordinates, to the image handler.
+        """
+        self._image_handler.rectangles(bboxes, fill, stroke, width=int(stroke_width))
+
+    def _circle_bbox(self, center_or_obj, radius):
         if isinstance(center_or_obj, (tuple, list)):
             center = center_or_obj
         else:
             obj = center_or_obj
             center = ((obj["x0"] + obj["x1"]) / 2, (obj["top"] + obj["bottom"]) / 2)
-        cx, cy = center
-        bbox = self.decimalize((cx - radius, cy - radius, cx + radius, cy + radius))
-        self._image_handler.ellipse(self._reproject_bbox(bbox), fill, stroke)
+        cx, cy = map(float, center)
+        return self._reproject_bbox((cx - radius, cy - radius, cx + radius, cy + radius))
+
+    def draw_circle(
+            self, center_or_obj, radius=5, fill=DEFAULT_FILL, stroke=DEFAULT_STROKE
+    ):
+        self._image_handler.ellipse(self._circle_bbox(center_or_obj, radius), fill, stroke)
         return self
 
-    def draw_circles(self, list_of_circles, **kwargs):
-        for x in utils.to_list(list_of_circles):
-            self.draw_circle(x, **kwargs)
+    def draw_circles(
+            self, list_of_circles, radius=5, fill=DEFAULT_FILL, stroke=DEFAULT_STROKE
+    ):
+        circle_bbox = self._circle_bbox
+        self._image_handler.ellipses(
+            [circle_bbox(x, radius) for x in _as_sequence(list_of_circles)], fill, stroke
+        )
         return self
 
     def save(self, *args, **kwargs):
@@ -552,8 +886,11 @@ class BasePageImage(object):
                 "or a TableFinder settings dict."
             )
 
-        for table in tf.tables:
-            self.debug_table(table)
+        # Every table is outlined in the same style, so all of their cells
+        # can go to the image handler as one batch.
+        self.draw_rects(
+            [cell for table in tf.tables for cell in table.cells], stroke_width=1
+        )
 
         self.draw_lines(tf.edges, stroke_width=1)
 
@@ -593,6 +930,33 @@ class BasePageImage(object):
         return self
 
     def _repr_png_(self):
+        # Notebooks call this on every re-render, so the encoded PNG is kept
+        # for as long as the image handler's version says nothing has been
+        # drawn or swapped out. Drawing on an image the handler handed out
+        # isn't counted though, so once the caller holds the annotated image
+        # or its draw, every render encodes afresh.
+        if not self._png_cacheable:
+            return self._encode_png()
+        handler = self._image_handler
+        cached = self._png_cache
+        if cached is not None and cached[0] == handler.version:
+            return cached[1]
+        mode = handler.unannotated_mode
+        kept = self._unannotated_png
+        if mode is not None and kept is not None and kept[0] == mode:
+            # Nothing's drawn since a reset to the same mode, and the
+            # original hasn't changed, so it's the same image as before.
+            png = kept[1]
+        else:
+            png = self._encode_png()
+            if mode is not None:
+                self._unannotated_png = (mode, png)
+        # read after encoding, in case saving bumped it, as a handler that
+        # queues its drawing may when it flushes.
+        self._png_cache = (handler.version, png)
+        return png
+
+    def _encode_png(self):
         with BytesIO() as b:
             self._image_handler.save(b, "PNG")
             return b.getvalue()
@@ -608,230 +972,3 @@ class PILPageImage(BasePageImage):
         super().__init__(page, original, resolution, image_handler_type)
 
 PageImage = PILPageImage
-
-# class PageImage(object):
-#     def __init__(self, page, original=None, resolution=DEFAULT_RESOLUTION):
-#         self.page = page
-#         if original is None:
-#             self.original = get_page_image(
-#                 page.pdf.stream, page.page_number - 1, resolution
-#             )
-#         else:
-#             self.original = original
-#
-#         d = self.page.decimalize
-#         self.decimalize = d
-#         if page.is_original:
-#             self.root = page
-#             cropped = False
-#         else:
-#             self.root = page.root_page
-#             cropped = page.root_page.bbox != page.bbox
-#         self.scale = d(self.original.size[0]) / d(self.root.width)
-#         if cropped:
-#             cropbox = (
-#                 (page.bbox[0] - page.root_page.bbox[0]) * self.scale,
-#                 (page.bbox[1] - page.root_page.bbox[1]) * self.scale,
-#                 (page.bbox[2] - page.root_page.bbox[0]) * self.scale,
-#                 (page.bbox[3] - page.root_page.bbox[1]) * self.scale,
-#             )
-#             self.original = self.original.crop(map(int, cropbox))
-#         self.reset()
-#
-#     def _reproject_bbox(self, bbox):
-#         x0, top, x1, bottom = bbox
-#         _x0, _top = self._reproject((x0, top))
-#         _x1, _bottom = self._reproject((x1, bottom))
-#         return (_x0, _top, _x1, _bottom)
-#
-#     def _reproject(self, coord):
-#         """
-#         Given an (x0, top) tuple from the *root* coordinate system,
-#         return an (x0, top) tuple in the *image* coordinate system.
-#         """
-#         x0, top = coord
-#         px0, ptop = self.page.bbox[:2]
-#         rx0, rtop = self.root.bbox[:2]
-#         _x0 = (x0 + rx0 - px0) * self.scale
-#         _top = (top + rtop - ptop) * self.scale
-#         return (_x0, _top)
-#
-#     def reset(self):
-#         self.annotated = PIL.Image.new(self.original.mode, self.original.size)
-#         self.annotated.paste(self.original)
-#         self.draw = PIL.ImageDraw.Draw(self.annotated, "RGBA")
-#         return self
-#
-#     def copy(self):
-#         return self.__class__(self.page, self.original)
-#
-#     def draw_line(
-#         self, points_or_obj, stroke=DEFAULT_STROKE, stroke_width=DEFAULT_STROKE_WIDTH
-#     ):
-#         if isinstance(points_or_obj, (tuple, list)):
-#             points = points_or_obj
-#         elif type(points_or_obj) == dict and "points" in points_or_obj:
-#             points = points_or_obj["points"]
-#         else:
-#             obj = points_or_obj
-#             points = ((obj["x0"], obj["top"]), (obj["x1"], obj["bottom"]))
-#         self.draw.line(
-#             list(map(self._reproject, points)), fill=stroke, width=stroke_width
-#         )
-#         return self
-#
-#     def draw_lines(self, list_of_lines, **kwargs):
-#         for x in utils.to_list(list_of_lines):
-#             self.draw_line(x, **kwargs)
-#         return self
-#
-#     def draw_vline(
-#         self, location, stroke=DEFAULT_STROKE, stroke_width=DEFAULT_STROKE_WIDTH
-#     ):
-#         points = (location, self.page.bbox[1], location, self.page.bbox[3])
-#         self.draw.line(self._reproject_bbox(points), fill=stroke, width=stroke_width)
-#         return self
-#
-#     def draw_vlines(self, locations, **kwargs):
-#         for x in utils.to_list(locations):
-#             self.draw_vline(x, **kwargs)
-#         return self
-#
-#     def draw_hline(
-#         self, location, stroke=DEFAULT_STROKE, stroke_width=DEFAULT_STROKE_WIDTH
-#     ):
-#         points = (self.page.bbox[0], location, self.page.bbox[2], location)
-#         self.draw.line(self._reproject_bbox(points), fill=stroke, width=stroke_width)
-#         return self
-#
-#     def draw_hlines(self, locations, **kwargs):
-#         for x in utils.to_list(locations):
-#             self.draw_hline(x, **kwargs)
-#         return self
-#
-#     def draw_rect(
-#         self,
-#         bbox_or_obj,
-#         fill=DEFAULT_FILL,
-#         stroke=DEFAULT_STROKE,
-#         stroke_width=DEFAULT_STROKE_WIDTH,
-#     ):
-#         if isinstance(bbox_or_obj, (tuple, list)):
-#             bbox = bbox_or_obj
-#         else:
-#             obj = bbox_or_obj
-#             bbox = (obj["x0"], obj["top"], obj["x1"], obj["bottom"])
-#
-#         x0, top, x1, bottom = bbox
-#         half = self.decimalize(stroke_width / 2)
-#         x0 += half
-#         top += half
-#         x1 -= half
-#         bottom -= half
-#
-#         self.draw.rectangle(
-#             self._reproject_bbox((x0, top, x1, bottom)), fill, COLORS.TRANSPARENT
-#         )
-#
-#         if stroke_width > 0:
-#             segments = [
-#                 ((x0, top), (x1, top)),  # top
-#                 ((x0, bottom), (x1, bottom)),  # bottom
-#                 ((x0, top), (x0, bottom)),  # left
-#                 ((x1, top), (x1, bottom)),  # right
-#             ]
-#             self.draw_lines(segments, stroke=stroke, stroke_width=stroke_width)
-#         return self
-#
-#     def draw_rects(self, list_of_rects, **kwargs):
-#         for x in utils.to_list(list_of_rects):
-#             self.draw_rect(x, **kwargs)
-#         return self
-#
-#     def draw_circle(
-#         self, center_or_obj, radius=5, fill=DEFAULT_FILL, stroke=DEFAULT_STROKE
-#     ):
-#         if isinstance(center_or_obj, (tuple, list)):
-#             center = center_or_obj
-#         else:
-#             obj = center_or_obj
-#             center = ((obj["x0"] + obj["x1"]) / 2, (obj["top"] + obj["bottom"]) / 2)
-#         cx, cy = center
-#         bbox = self.decimalize((cx - radius, cy - radius, cx + radius, cy + radius))
-#         self.draw.ellipse(self._reproject_bbox(bbox), fill, stroke)
-#         return self
-#
-#     def draw_circles(self, list_of_circles, **kwargs):
-#         for x in utils.to_list(list_of_circles):
-#             self.draw_circle(x, **kwargs)
-#         return self
-#
-#     def save(self, *args, **kwargs):
-#         return self.annotated.save(*args, **kwargs)
-#
-#     def debug_table(
-#         self, table, fill=DEFAULT_FILL, stroke=DEFAULT_STROKE, stroke_width=1
-#     ):
-#         """
-#         Outline all found tables.
-#         """
-#         self.draw_rects(
-#             table.cells, fill=fill, stroke=stroke, stroke_width=stroke_width
-#         )
-#         return self
-#
-#     def debug_tablefinder(self, tf={}):
-#         if isinstance(tf, TableFinder):
-#             pass
-#         elif isinstance(tf, dict):
-#             tf = self.page.debug_tablefinder(tf)
-#         else:
-#             raise ValueError(
-#                 "Argument must be instance of TableFinder"
-#                 "or a TableFinder settings dict."
-#             )
-#
-#         for table in tf.tables:
-#             self.debug_table(table)
-#
-#         self.draw_lines(tf.edges, stroke_width=1)
-#
-#         self.draw_circles(
-#             tf.intersections.keys(),
-#             fill=COLORS.TRANSPARENT,
-#             stroke=COLORS.BLUE + (200,),
-#             radius=3,
-#         )
-#         return self
-#
-#     def outline_words(
-#         self,
-#         stroke=DEFAULT_STROKE,
-#         fill=DEFAULT_FILL,
-#         stroke_width=DEFAULT_STROKE_WIDTH,
-#         x_tolerance=utils.DEFAULT_X_TOLERANCE,
-#         y_tolerance=utils.DEFAULT_Y_TOLERANCE,
-#     ):
-#
-#         words = self.page.extract_words(
-#             x_tolerance=x_tolerance, y_tolerance=y_tolerance
-#         )
-#         self.draw_rects(words, stroke=stroke, fill=fill, stroke_width=stroke_width)
-#         return self
-#
-#     def outline_chars(
-#         self,
-#         stroke=(255, 0, 0, 255),
-#         fill=(255, 0, 0, int(255 / 4)),
-#         stroke_width=DEFAULT_STROKE_WIDTH,
-#     ):
-#
-#         self.draw_rects(
-#             self.page.chars, stroke=stroke, fill=fill, stroke_width=stroke_width
-#         )
-#         return self
-#
-#     def _repr_png_(self):
-#         b = BytesIO()
-#         self.annotated.save(b, "PNG")
-#         return b.getvalue()
\ No newline at end of file
@@ -1,7 +1,7 @@
 from .container import Container
 from .page import Page
 from .utils import decode_text
-from .display import BasePageImage,PageImage
+from .display import BasePageImage,PageImage,DEFAULT_RESOLUTION,rasterize_pages
 import pathlib
 import itertools
 from pdfminer.pdfparser import PDFParser
@@ -60,16 +60,29 @@ class PDF(Container):
 
         doctop = 0
         pp = self.pages_to_parse
+        last_page_number = max(pp) if pp else None
         self._pages = []
         for i, page in enumerate(PDFPage.create_pages(self.doc)):
             page_number = i + 1
             if pp is not None and page_number not in pp:
+                # No need to walk the rest of the page tree once
+                # every requested page has been found.
+                if last_page_number is not None and page_number > last_page_number:
+                    break
                 continue
             p = Page(self, page, page_number=page_number, initial_doctop=doctop, page_image_type=self.page_image_type)
             self._pages.append(p)
             doctop += p.height
         return self._pages
 
+    def rasterize_all(self, resolution=DEFAULT_RESOLUTION, max_workers=1):
+        """
+        Returns a PIL image of every page in self.pages. Pass max_workers > 1
+        to render them in parallel. See display.rasterize_pages.
+        """
+        page_nos = [p.page_number - 1 for p in self.pages]
+        return rasterize_pages(self.stream, page_nos, resolution, max_workers)
+
     def close(self):
         self.stream.close()
 
@@ -31,6 +31,11 @@ class Test(unittest.TestCase):
         assert self.pdf.pages[0].page_number == 1
         assert str(self.pdf.pages[0]) == "<Page:1>"
 
+    def test_pages_to_parse(self):
+        path = os.path.join(HERE, "pdfs/pdffill-demo.pdf")
+        with pdfplumber.open(path, pages=[2, 4]) as pdf:
+            assert [p.page_number for p in pdf.pages] == [2, 4]
+
     def test_objects(self):
         assert len(self.pdf.chars)
         assert len(self.pdf.rects)
@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 import unittest
 import pdfplumber
+from pdfplumber.display import COLORS, DEFAULT_FILL, DEFAULT_STROKE, PageImage, get_page_image
+import PIL.ImageDraw
 import sys, os, io
 
 import logging
@@ -8,6 +10,35 @@ logging.disable(logging.ERROR)
 
 HERE = os.path.abspath(os.path.dirname(__file__))
 
+def decimal_reproject(im, x, y):
+    """How PageImage reprojected a point before its math moved to floats."""
+    return (
+        (x + im.root.bbox[0] - im.page.bbox[0]) * im.scale,
+        (y + im.root.bbox[1] - im.page.bbox[1]) * im.scale,
+    )
+
+def reference_image(im):
+    """A fresh copy of im's original to draw the expected annotations on."""
+    ref = im.original.convert("RGBA")
+    return ref, PIL.ImageDraw.Draw(ref, "RGBA")
+
+def draw_rects_per_edge(im, draw, rects, fill, stroke, stroke_width):
+    """How draw_rect drew before rects were batched: a fill, then each edge as
+    a line of its own, all in Decimals."""
+    half = im.decimalize(stroke_width / 2)
+    for r in rects:
+        x0, top = decimal_reproject(im, r["x0"] + half, r["top"] + half)
+        x1, bottom = decimal_reproject(im, r["x1"] - half, r["bottom"] - half)
+        draw.rectangle((x0, top, x1, bottom), fill, COLORS.TRANSPARENT)
+        if stroke_width > 0:
+            for edge in (
+                    ((x0, top), (x1, top)),
+                    ((x0, bottom), (x1, bottom)),
+                    ((x0, top), (x0, bottom)),
+                    ((x1, top), (x1, bottom)),
+            ):
+                draw.line(edge, fill=stroke, width=stroke_width)
+
 class Test(unittest.TestCase):
 
     @classmethod
@@ -26,6 +57,158 @@ class Test(unittest.TestCase):
         self.im.draw_circle(self.im.page.chars[0])
         self.im.draw_line(self.im.page.edges[0])
 
+    def test_reset_clears_annotations(self):
+        im = self.pdf.pages[0].to_image()
+        blank = im.annotated.tobytes()
+        im.draw_rect(im.page.rects[0])
+        assert im.annotated.tobytes() != blank
+        im.reset()
+        assert im.annotated.tobytes() == blank
+
+    def test_reset_leaves_held_image_alone(self):
+        im = self.pdf.pages[0].to_image()
+        im.draw_rect(im.page.rects[0])
+        snap = im.annotated
+        drawn = snap.tobytes()
+        im.reset()
+        im.draw_rect(im.page.rects[1])
+        assert im.annotated is not snap
+        assert snap.tobytes() == drawn
+
+    def test_reset_is_opaque_rgba(self):
+        im = self.pdf.pages[0].to_image()
+        im.reset()
+        assert im.annotated.mode == "RGBA"
+        assert im.annotated.getchannel("A").getextrema() == (255, 255)
+
+    def test_reset_then_draw(self):
+        im = self.pdf.pages[0].to_image()
+        im.draw_rect(im.page.rects[0])
+        im.reset()
+        im.reset()
+        png = im._repr_png_()
+        assert png.startswith(b"\x89PNG")
+        assert im._repr_png_() is png
+        im.draw_rect(im.page.rects[0])
+        assert im._repr_png_() != png
+
+    def test_repr_png_reused_after_reset(self):
+        im = self.pdf.pages[0].to_image()
+        png = im._repr_png_()
+        im.draw_rect(im.page.rects[0])
+        assert im._repr_png_() != png
+        im.reset()
+        assert im._repr_png_() is png
+
+    def test_repr_png_sees_drawing_through_draw(self):
+        im = self.pdf.pages[0].to_image()
+        draw = im.draw
+        png = im._repr_png_()
+        draw.rectangle((10, 10, 50, 50), fill=(0, 0, 0))
+        assert im._repr_png_() != png
+        im.reset()
+        png = im._repr_png_()
+        assert im._repr_png_() is png
+
+    def test_repr_png_sees_changes_to_original(self):
+        im = self.pdf.pages[0].to_image()
+        png = im._repr_png_()
+        im.original.paste((0, 0, 0), (0, 0, 10, 10))
+        im.reset()
+        assert im._repr_png_() != png
+
+    def test_repr_png_sees_drawing_by_subclasses(self):
+        class CrossPageImage(PageImage):
+            # draws through the image handler directly, knowing nothing of the PNG cache.
+            def draw_cross(self, bbox):
+                x0, top, x1, bottom = self._reproject_bbox(bbox)
+                self._image_handler.lines(
+                    [((x0, top), (x1, bottom)), ((x0, bottom), (x1, top))], DEFAULT_STROKE, 1
+                )
+                return self
+
+        im = CrossPageImage(self.pdf.pages[0])
+        png = im._repr_png_()
+        assert im._repr_png_() is png
+        im.draw_cross((10, 10, 100, 100))
+        assert im._repr_png_() != png
+
+    def test_float_reprojection_matches_decimal(self):
+        im = self.pdf.pages[0].to_image(resolution=100)
+        rects, edges = im.page.rects, im.page.edges[:200]
+        im.draw_rects(rects, stroke_width=0)
+        im.draw_lines(edges)
+        ref, draw = reference_image(im)
+        for r in rects:
+            bbox = decimal_reproject(im, r["x0"], r["top"]) + decimal_reproject(im, r["x1"], r["bottom"])
+            draw.rectangle(bbox, DEFAULT_FILL, COLORS.TRANSPARENT)
+        for e in edges:
+            points = [decimal_reproject(im, e["x0"], e["top"]), decimal_reproject(im, e["x1"], e["bottom"])]
+            draw.line(points, fill=DEFAULT_STROKE, width=1)
+        assert im.annotated.tobytes() == ref.tobytes()
+
+    def test_draw_rects_matches_per_edge_drawing(self):
+        page = self.pdf.pages[0]
+        rects = [c for c in page.chars if c["width"] > 4 and c["height"] > 4][:40]
+        for stroke_width in (1, 3):
+            im = page.to_image(resolution=100)
+            im.draw_rects(rects, stroke_width=stroke_width)
+            ref, draw = reference_image(im)
+            draw_rects_per_edge(im, draw, rects, DEFAULT_FILL, DEFAULT_STROKE, stroke_width)
+            assert im.annotated.tobytes() == ref.tobytes()
+
+    def test_batches_match_one_at_a_time_drawing(self):
+        page = self.pdf.pages[0]
+        chars, edges = page.chars, page.edges[:200]
+        im = page.to_image(resolution=100)
+        im.outline_chars()
+        im.draw_lines(edges)
+        im.draw_circles(chars[:200])
+        ref, draw = reference_image(im)
+        draw_rects_per_edge(im, draw, chars, (255, 0, 0, int(255 / 4)), (255, 0, 0, 255), 1)
+        for e in edges:
+            points = [decimal_reproject(im, e["x0"], e["top"]), decimal_reproject(im, e["x1"], e["bottom"])]
+            draw.line(points, fill=DEFAULT_STROKE, width=1)
+        for c in chars[:200]:
+            cx, cy = (c["x0"] + c["x1"]) / 2, (c["top"] + c["bottom"]) / 2
+            bbox = decimal_reproject(im, cx - 5, cy - 5) + decimal_reproject(im, cx + 5, cy + 5)
+            draw.ellipse(bbox, DEFAULT_FILL, DEFAULT_STROKE)
+        assert im.annotated.tobytes() == ref.tobytes()
+
+    def test_draw_rects_on_cropped_page_matches_per_edge_drawing(self):
+        # A crop gives draw_rects a nonzero offset to fold into its constants.
+        page = self.pdf.pages[0].crop((10, 20, 300, 400))
+        rects = [c for c in page.chars if c["width"] > 4 and c["height"] > 4]
+        im = page.to_image(resolution=150)
+        im.draw_rects(rects, stroke_width=2)
+        ref, draw = reference_image(im)
+        draw_rects_per_edge(im, draw, rects, DEFAULT_FILL, DEFAULT_STROKE, 2)
+        assert im.annotated.tobytes() == ref.tobytes()
+
+    def test_set_annotated(self):
+        im = self.pdf.pages[0].to_image()
+        im.annotated = "RGB"
+        assert im.annotated.mode == "RGB"
+        im.draw_rect(im.page.rects[0])
+        drawn = im.annotated.tobytes()
+        im.annotated = im.original.copy()
+        im.annotated = drawn
+        assert im.annotated.tobytes() == drawn
+        im.draw_rect(im.page.rects[1])
+        assert im.annotated.tobytes() != drawn
+
+    def test_copy_keeps_annotations(self):
+        im = self.pdf.pages[0].to_image()
+        im.draw_rect(im.page.rects[0])
+        drawn = im.annotated.tobytes()
+        im.copy().draw_rect(im.page.rects[1])
+        assert im.annotated.tobytes() == drawn
+
+    def test_draw_vlines_and_hlines(self):
+        self.im.reset()
+        self.im.draw_vlines([10, 20])
+        self.im.draw_hlines([10, 20])
+
     def test_debug_tablefinder(self):
         self.im.reset()
         settings = {
@@ -34,6 +217,30 @@ class Test(unittest.TestCase):
         }
         self.im.debug_tablefinder(settings)
 
+    def test_rasterize_all(self):
+        images = self.pdf.rasterize_all(resolution=36)
+        assert len(images) == len(self.pdf.pages)
+        assert images[0].size == self.pdf.pages[0].to_image(resolution=36).original.size
+
+    def test_threaded_rasterize_matches_sequential(self):
+        path = os.path.join(HERE, "pdfs/pdffill-demo.pdf")
+        with pdfplumber.open(path, pages=[1, 2, 3, 4]) as pdf:
+            threaded = pdf.rasterize_all(resolution=36, max_workers=4)
+            sequential = [
+                get_page_image(pdf.stream, p.page_number - 1, 36)
+                for p in pdf.pages
+            ]
+        assert len(threaded) == len(sequential) == 4
+        for a, b in zip(threaded, sequential):
+            assert a.size == b.size
+            assert a.tobytes() == b.tobytes()
+
+    def test_cropped_page_to_image(self):
+        page = self.pdf.pages[0]
+        im = page.crop((10, 20, 300, 400)).to_image(resolution=150)
+        assert im.original.size == (605, 792)
+        im.draw_rect(im.page.bbox)
+
     def test_bytes_stream_to_image(self):
         path = os.path.join(HERE, "pdfs/nics-background-checks-2015-11.pdf")
         page = pdfplumber.PDF(io.BytesIO(open(path, 'rb').read())).pages[0]